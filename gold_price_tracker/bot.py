@@ -13,22 +13,35 @@ Features:
   - /help           — Full help text
 """
 
-from flask import Flask, jsonify
+import asyncio
 import threading
 import os
+import queue
+import random
 import time
 import logging
 import sqlite3
+import string
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from bs4 import BeautifulSoup
+from logging.handlers import QueueHandler, QueueListener
+from lxml import etree, html as lxml_html
 import cloudscraper
+from urllib3.util import Retry
 from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackContext,
 )
+from telegram.error import RetryAfter
+
+try:
+    import uvloop  # optional: faster event loop, not available on Windows
+except ImportError:
+    uvloop = None
 
 # ---------------------------------------------------------------------------
 # Logging
@@ -39,6 +52,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def _start_log_listener() -> QueueListener:
+    """
+    Route all records through a queue so the stderr write happens on a
+    listener thread instead of stalling the event loop. QueueHandler still
+    formats each record (%-args, tracebacks) on the calling thread.
+    """
+    root = logging.getLogger()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
 # ---------------------------------------------------------------------------
 # Config & constants
 # ---------------------------------------------------------------------------
@@ -47,8 +74,13 @@ if not TOKEN:
     raise ValueError("TOKEN environment variable not set.")
 
 DB_PATH = os.getenv("DB_PATH", "bot_data.db")
-CACHE_TTL = 30 * 60        # 30 minutes in seconds
-ALERT_CHECK_INTERVAL = 3600  # check alerts every 60 minutes
+CACHE_TTL = int(os.getenv("CACHE_TTL", 30 * 60))  # seconds; default 30 minutes
+ALERT_CHECK_INTERVAL = 6 * 3600  # safety-net alert sweep; price events fire sooner
+TELEGRAM_SEND_CONCURRENCY = 20  # sends per TELEGRAM_SEND_WINDOW, shared by all senders
+TELEGRAM_SEND_WINDOW = 1.0      # seconds a send keeps its slot (limit is ~30 msg/s)
+TELEGRAM_SEND_RETRIES = 3       # resends after Telegram answers 429 RetryAfter
+SCRAPE_WORKERS = 4           # threads for blocking fetch + parse work
+DAILY_JOB_JITTER = 300       # max seconds added to the 9 AM IST daily push
 BOT_START_TIME = time.time()
 
 # Supported metals with their URL slug and display metadata
@@ -84,62 +116,147 @@ CITIES = {
 DEFAULT_CITY  = "bangalore"
 DEFAULT_METAL = "gold"
 
+# Source page for every supported (metal, city) pair, built once at import;
+# a single lookup both validates the pair and yields its URL
+_URL_BY_KEY = {
+    (metal, city): f"https://www.goodreturns.in/{info['url_slug']}/{city}.html"
+    for metal, info in METALS.items()
+    for city in CITIES
+}
+
 # ---------------------------------------------------------------------------
-# Flask health-check server
+# Health-check server
 # ---------------------------------------------------------------------------
-flask_app = Flask(__name__)
+# A minimal asyncio endpoint on the bot's own event loop: the host only needs
+# an open port that answers 200, which doesn't justify a WSGI stack or a
+# dedicated server thread.
+HEALTH_PORT  = 10000
+_HEALTH_BODY = b'{"status": "ok", "message": "Bot server is running"}'
+# The whole reply is constant, so it is assembled once and written as is
+_HEALTH_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: close\r\n\r\n" % len(_HEALTH_BODY)
+) + _HEALTH_BODY
+
+
+async def _handle_health(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        # Drain the request head so closing doesn't reset the connection
+        await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        writer.write(_HEALTH_RESPONSE)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            asyncio.TimeoutError, ConnectionError):
+        pass  # probe hung up or sent junk; nothing to answer
+    finally:
+        writer.close()
 
-@flask_app.route("/")
-def home():
-    return jsonify({"status": "ok", "message": "Bot server is running"})
 
+async def start_health_server(port: int = HEALTH_PORT) -> asyncio.Server:
+    return await asyncio.start_server(_handle_health, "0.0.0.0", port)
 
-def start_flask_server():
-    flask_app.run(host="0.0.0.0", port=10000, use_reloader=False)
+
+def _open_health_port(loop: asyncio.AbstractEventLoop, port: int = HEALTH_PORT) -> asyncio.Server | None:
+    """Start the health server on loop. A bind failure is logged, not fatal."""
+    try:
+        return loop.run_until_complete(start_health_server(port))
+    except OSError as exc:
+        logger.error("Health-check server not started on port %d: %s", port, exc)
+        return None
 
 # ---------------------------------------------------------------------------
 # Database layer
 # ---------------------------------------------------------------------------
 
+# One long-lived connection per thread (event loop, JobQueue, worker threads).
+# Opening a connection per statement costs several file opens plus pragma and
+# statement-cache setup, which dominates the tiny queries this bot runs.
+_tls = threading.local()
+
+
 def get_db_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    """Return this thread's cached connection, opening it on first use."""
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and _tls.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()  # DB_PATH changed (tests point it at temp files)
+
+    # isolation_level=None: we issue BEGIN/COMMIT ourselves in db().
+    # cached_statements: every helper's SQL stays prepared on the long-lived conn.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None,
+                           cached_statements=256)
     conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-4000;
+        PRAGMA mmap_size=268435456;
+    """)
+    _tls.conn = conn
+    _tls.path = DB_PATH
     return conn
 
 
+# Handlers run write helpers via asyncio.to_thread: BEGIN IMMEDIATE can wait
+# on the busy timeout while a scrape thread holds the write lock, and that
+# wait must not stall the event loop. WAL reads never block, so read helpers
+# are called directly.
 @contextmanager
 def db():
-    """Context manager that auto-commits or rolls back."""
+    """Run the block in a write transaction on the thread's cached connection."""
     conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
     try:
         yield conn
-        conn.commit()
+        conn.execute("COMMIT")
     except Exception:
-        conn.rollback()
+        conn.execute("ROLLBACK")
         raise
-    finally:
-        conn.close()
 
 
 def init_db():
     """Create tables if they don't exist."""
-    with db() as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS subscriptions (
-                chat_id   INTEGER PRIMARY KEY,
-                city      TEXT    NOT NULL DEFAULT 'bangalore',
-                metal     TEXT    NOT NULL DEFAULT 'gold',
-                created_at TEXT   NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS alerts (
-                chat_id        INTEGER PRIMARY KEY,
-                metal          TEXT    NOT NULL DEFAULT 'gold',
-                city           TEXT    NOT NULL DEFAULT 'bangalore',
-                threshold      REAL    NOT NULL,
-                created_at     TEXT    NOT NULL
-            );
-        """)
+    # executescript() manages its own transaction, so run it outside db()
+    conn = get_db_connection()
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            chat_id   INTEGER PRIMARY KEY,
+            city      TEXT    NOT NULL DEFAULT 'bangalore',
+            metal     TEXT    NOT NULL DEFAULT 'gold',
+            created_at TEXT   NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS alerts (
+            chat_id        INTEGER PRIMARY KEY,
+            metal          TEXT    NOT NULL DEFAULT 'gold',
+            city           TEXT    NOT NULL DEFAULT 'bangalore',
+            threshold      REAL    NOT NULL,
+            created_at     TEXT    NOT NULL,
+            notified_price REAL              -- price last delivered at; NULL = not yet
+        );
+
+        CREATE TABLE IF NOT EXISTS price_cache (
+            metal          TEXT    NOT NULL,
+            city           TEXT    NOT NULL,
+            message        TEXT    NOT NULL,
+            price          REAL    NOT NULL,
+            fetched_at     REAL    NOT NULL,
+            PRIMARY KEY (metal, city)
+        );
+
+        -- Serves both the per-group MAX(threshold) scan and the threshold
+        -- range filter in the alert job
+        CREATE INDEX IF NOT EXISTS alerts_metal_city
+            ON alerts (metal, city, threshold);
+    """)
+    # Databases created before notified_price existed
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(alerts)")}
+    if "notified_price" not in columns:
+        conn.execute("ALTER TABLE alerts ADD COLUMN notified_price REAL")
     logger.info("Database initialised at %s", DB_PATH)
 
 
@@ -163,18 +280,22 @@ def remove_subscription(chat_id: int) -> bool:
 
 
 def get_all_subscriptions() -> list[dict]:
-    with db() as conn:
-        rows = conn.execute("SELECT chat_id, city, metal FROM subscriptions").fetchall()
-        return [dict(r) for r in rows]
+    rows = get_db_connection().execute(
+        "SELECT chat_id, city, metal FROM subscriptions"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def count_subscriptions() -> int:
+    return get_db_connection().execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0]
 
 
 def get_subscription(chat_id: int) -> dict | None:
-    with db() as conn:
-        row = conn.execute(
-            "SELECT chat_id, city, metal FROM subscriptions WHERE chat_id = ?",
-            (chat_id,)
-        ).fetchone()
-        return dict(row) if row else None
+    row = get_db_connection().execute(
+        "SELECT chat_id, city, metal FROM subscriptions WHERE chat_id = ?",
+        (chat_id,)
+    ).fetchone()
+    return dict(row) if row else None
 
 
 # --- Alerts ---
@@ -187,7 +308,8 @@ def set_alert(chat_id: int, metal: str, city: str, threshold: float):
             ON CONFLICT(chat_id) DO UPDATE SET metal=excluded.metal,
                                                city=excluded.city,
                                                threshold=excluded.threshold,
-                                               created_at=excluded.created_at
+                                               created_at=excluded.created_at,
+                                               notified_price=NULL
         """, (chat_id, metal, city, threshold, datetime.datetime.utcnow().isoformat()))
 
 
@@ -198,26 +320,129 @@ def remove_alert(chat_id: int) -> bool:
 
 
 def get_alert(chat_id: int) -> dict | None:
-    with db() as conn:
-        row = conn.execute(
-            "SELECT chat_id, metal, city, threshold FROM alerts WHERE chat_id = ?",
-            (chat_id,)
-        ).fetchone()
-        return dict(row) if row else None
+    row = get_db_connection().execute(
+        "SELECT chat_id, metal, city, threshold FROM alerts WHERE chat_id = ?",
+        (chat_id,)
+    ).fetchone()
+    return dict(row) if row else None
 
 
 def get_all_alerts() -> list[dict]:
+    rows = get_db_connection().execute(
+        "SELECT chat_id, metal, city, threshold FROM alerts"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def count_alerts() -> int:
+    return get_db_connection().execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+
+
+def get_alert_groups() -> list[dict]:
+    """Every (metal, city) pair with at least one alert, plus its highest threshold."""
+    rows = get_db_connection().execute(
+        "SELECT metal, city, MAX(threshold) AS max_threshold FROM alerts GROUP BY metal, city"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_triggered_alerts(metal: str, city: str, price: float) -> list[dict]:
+    """
+    Alerts for (metal, city) whose threshold is above the current price and
+    that have not already been delivered at this exact price.
+    """
+    rows = get_db_connection().execute("""
+        SELECT chat_id, threshold FROM alerts
+        WHERE metal = ? AND city = ? AND threshold > ?
+          AND (notified_price IS NULL OR notified_price != ?)
+    """, (metal, city, price, price)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def mark_alerts_notified(metal: str, city: str, chat_ids, price: float):
+    """Record that these chats' (metal, city) alerts were delivered at price."""
+    with db() as conn:
+        conn.executemany(
+            "UPDATE alerts SET notified_price = ? WHERE chat_id = ? AND metal = ? AND city = ?",
+            [(price, chat_id, metal, city) for chat_id in chat_ids],
+        )
+
+
+# --- Price cache persistence ---
+
+def save_cached_price(metal: str, city: str, message: str, price: float, fetched_at: float):
     with db() as conn:
-        rows = conn.execute(
-            "SELECT chat_id, metal, city, threshold FROM alerts"
-        ).fetchall()
-        return [dict(r) for r in rows]
+        conn.execute("""
+            INSERT OR REPLACE INTO price_cache (metal, city, message, price, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (metal, city, message, price, fetched_at))
+
+
+def get_cached_prices_since(cutoff: float) -> list[dict]:
+    """Persisted cache rows fetched at or after `cutoff` (a time.time() value)."""
+    rows = get_db_connection().execute(
+        "SELECT metal, city, message, price, fetched_at FROM price_cache WHERE fetched_at >= ?",
+        (cutoff,)
+    ).fetchall()
+    return [dict(r) for r in rows]
 
 
 # ---------------------------------------------------------------------------
 # Price cache  {(metal, city): {"data": str, "timestamp": float, "price": float}}
 # ---------------------------------------------------------------------------
-_price_cache: dict[tuple, dict] = {}
+
+class _PriceCache:
+    """
+    Thread-safe LRU map of rendered price messages, shared by the event loop,
+    the JobQueue and scraper worker threads. Timestamps come from
+    time.monotonic() so NTP adjustments can't expire or resurrect entries.
+    """
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get_fresh(self, key: tuple, ttl: float) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (time.monotonic() - entry["timestamp"]) >= ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def items(self) -> list[tuple[tuple, dict]]:
+        """Snapshot of (key, entry) pairs, oldest use first."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def __getitem__(self, key: tuple) -> dict:
+        with self._lock:
+            return self._entries[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_price_cache = _PriceCache(maxsize=len(METALS) * len(CITIES))
+
+# Fresh prices flow from _set_cache() to alert_worker() through this queue, so
+# alerts fire as soon as any scrape sees a new price. Both are bound to the
+# bot's event loop in _post_init().
+_event_loop:   asyncio.AbstractEventLoop | None = None
+_price_events: asyncio.Queue | None = None
 
 
 def _cache_key(metal: str, city: str) -> tuple:
@@ -225,39 +450,103 @@ def _cache_key(metal: str, city: str) -> tuple:
 
 
 def _get_cached(metal: str, city: str) -> dict | None:
-    entry = _price_cache.get(_cache_key(metal, city))
-    if entry and (time.time() - entry["timestamp"]) < CACHE_TTL:
-        return entry
-    return None
+    return _price_cache.get_fresh(_cache_key(metal, city), CACHE_TTL)
 
 
 def _set_cache(metal: str, city: str, message: str, price: float):
-    _price_cache[_cache_key(metal, city)] = {
+    _price_cache.put(_cache_key(metal, city), {
         "data":      message,
-        "timestamp": time.time(),
+        "timestamp": time.monotonic(),
         "price":     price,
-    }
+    })
+    _publish_price(metal, city, price)
+
+
+def _cached_price(metal: str, city: str) -> float | None:
+    """
+    Numeric price from a fresh cache entry, or None when there is no fresh
+    entry or the scrape could not read the "Today" cell (stored as 0.0).
+    """
+    entry = _get_cached(metal, city)
+    if entry is None or entry["price"] <= 0:
+        return None
+    return entry["price"]
+
+
+def _publish_price(metal: str, city: str, price: float):
+    """
+    Queue a fresh price for alert_worker(). Scrapes run in worker threads, so
+    the hand-off goes through call_soon_threadsafe. No-op until the bot's
+    event loop is up (and in tests), and once it has closed.
+    """
+    if _event_loop is None or _price_events is None or price <= 0:
+        return
+    try:
+        _event_loop.call_soon_threadsafe(
+            _price_events.put_nowait, (metal.lower(), city.lower(), price)
+        )
+    except RuntimeError:
+        # Loop closed during shutdown; the scrape itself still succeeded
+        logger.debug("Event loop closed, price event for %s/%s dropped", metal, city)
+
+
+def _persist_cache(metal: str, city: str, message: str, price: float):
+    """
+    Write a fresh entry through to SQLite so a restart starts with a warm
+    cache instead of every job and command scraping at once.
+    Failures are logged, never raised — the in-memory cache still works.
+    """
+    try:
+        save_cached_price(metal, city, message, price, time.time())
+    except sqlite3.Error as exc:
+        logger.warning("Could not persist cache for %s/%s: %s", metal, city, exc)
+
+
+def load_persisted_cache() -> int:
+    """Seed the in-memory cache from rows still within CACHE_TTL. Returns the count."""
+    now_wall = time.time()
+    now_mono = time.monotonic()
+    rows = get_cached_prices_since(now_wall - CACHE_TTL)
+    for row in rows:
+        _price_cache.put(_cache_key(row["metal"], row["city"]), {
+            "data":      row["message"],
+            # translate the wall-clock fetch time onto the monotonic clock
+            "timestamp": now_mono - (now_wall - row["fetched_at"]),
+            "price":     row["price"],
+        })
+    return len(rows)
 
 # ---------------------------------------------------------------------------
 # Scraper
 # ---------------------------------------------------------------------------
 
+# Characters dropped from a price cell in one C-level pass: rupee sign,
+# thousands separators and the non-breaking space the site uses after "₹"
+_PRICE_TRANS = str.maketrans("", "", "₹,\u00a0")
+
+
 def _parse_price_from_cell(text: str) -> float | None:
     """
     Extract a numeric price from a cell like '₹6,123' or '6,123.50'.
     Returns None if parsing fails.
     """
-    cleaned = text.replace("₹", "").replace(",", "").strip()
-    # Take first token in case there's trailing text
-    token = cleaned.split()[0] if cleaned.split() else ""
+    # Take first token in case there's trailing text; split() also skips
+    # leading whitespace and treats tabs/newlines as separators
+    tokens = text.translate(_PRICE_TRANS).split(None, 1)
+    if not tokens:
+        return None
     try:
-        return float(token)
+        return float(tokens[0])
     except ValueError:
         return None
 
 
 def _display_len(s: str) -> int:
-    """Visual display width of a string — emoji count as 2, ASCII as 1."""
+    """
+    Visual display width of a string — emoji count as 2, ASCII as 1.
+    Not used when rendering (see _cell_width); kept as the general reference
+    the tests check table alignment and _cell_width against.
+    """
     width = 0
     for ch in s:
         cp = ord(ch)
@@ -282,14 +571,26 @@ def _display_len(s: str) -> int:
     return width
 
 
+def _cell_width(s: str) -> int:
+    """
+    Display width of a price-table cell. The only wide characters the table
+    ever holds are the 🔴/🟢 change markers (one codepoint, two cells), so two
+    C-level counts replace the per-codepoint scan in _display_len.
+    """
+    return len(s) + s.count("🔴") + s.count("🟢")
+
+
+# Format specs count code points, so the target width is reduced by the extra
+# display columns each wide emoji takes up.
 def _pad_right(s: str, width: int) -> str:
-    return s + " " * max(0, width - _display_len(s))
+    return f"{s:<{width + len(s) - _cell_width(s)}}"
 
 
 def _pad_center(s: str, width: int) -> str:
-    padding = max(0, width - _display_len(s))
-    left = padding // 2
-    return " " * left + s + " " * (padding - left)
+    return f"{s:^{width + len(s) - _cell_width(s)}}"
+
+
+_NEGATIVE_SIGNS = frozenset("−-")  # the site uses U+2212; plain hyphen as fallback
 
 
 def _build_table_str(headers: list[str], rows: list[list[str]]) -> str:
@@ -301,25 +602,94 @@ def _build_table_str(headers: list[str], rows: list[list[str]]) -> str:
     for row in rows:
         if len(row) > COL_CHANGE:
             change = row[COL_CHANGE]
-            is_negative = change.startswith("−") or change.startswith("-")
-            row[COL_CHANGE] = f"{'🔴' if is_negative else '🟢'} {change}"
+            row[COL_CHANGE] = f"{'🔴' if change[:1] in _NEGATIVE_SIGNS else '🟢'} {change}"
 
-    col_count = len(headers)
-    column_widths = [
-        max(_display_len(headers[i]), max(_display_len(row[i]) for row in rows))
-        for i in range(col_count)
-    ]
+    # Transpose header + rows once; each column's width is a single map()
+    column_widths = [max(map(_cell_width, column)) for column in zip(headers, *rows)]
 
     separator  = "-+-".join("-" * w for w in column_widths)
-    header_row = " | ".join(_pad_center(headers[i], column_widths[i]) for i in range(col_count))
+    header_row = " | ".join(_pad_center(h, w) for h, w in zip(headers, column_widths))
 
     lines = [header_row, separator]
-    for row in rows:
-        lines.append(" | ".join(_pad_right(row[i], column_widths[i]) for i in range(col_count)))
-
+    lines.extend(
+        " | ".join(_pad_right(cell, w) for cell, w in zip(row, column_widths))
+        for row in rows
+    )
     return "\n".join(lines)
 
 
+# XPath expressions compiled once at import rather than per scrape.
+# The price table sits inside the first section whose data-gr-title contains
+# the metal keyword (case-insensitive) — more resilient than an exact title
+# match. 'table-conatiner' is a typo on the source website itself.
+_PRICE_TABLE_XPATH = etree.XPath(
+    "//section[contains(translate(@data-gr-title, $upper, $lower), $keyword)]"
+    "//table[contains(@class, 'table-conatiner')]"
+)
+_HEADER_CELLS_XPATH = etree.XPath("./thead//th")
+_BODY_ROWS_XPATH    = etree.XPath("./tbody//tr")
+_ROW_CELLS_XPATH    = etree.XPath("./td")
+
+# lxml has no parse-only filter, but its parser can drop nodes we never read
+# (comments, processing instructions) while tokenising instead of building
+# them into the tree. Parsers must not be shared across threads, so each
+# scrape worker keeps its own.
+_parser_tls = threading.local()
+
+
+def _html_parser():
+    parser = getattr(_parser_tls, "parser", None)
+    if parser is None:
+        parser = _parser_tls.parser = lxml_html.HTMLParser(
+            remove_comments=True, remove_pis=True,
+        )
+    return parser
+
+
+# One scraper shared by every fetch: reusing its session keeps the TCP/TLS
+# connection and Cloudflare clearance cookies alive between scrapes.
+_scraper = None
+_scraper_lock = threading.Lock()
+_encoding_logged = False  # Content-Encoding of the first successful scrape
+
+# Transient 5xx from the origin are retried inside the session's own adapters
+# (cloudscraper mounts a cipher-suite adapter we must keep, so we only tune it).
+# 503 is left out: it is Cloudflare's challenge page, which cloudscraper
+# itself detects and solves, so it must reach the scraper untouched.
+_SCRAPE_RETRY = Retry(
+    total=2,
+    backoff_factor=0.5,
+    status_forcelist=(500, 502, 504),
+    allowed_methods=frozenset({"GET"}),
+    raise_on_status=False,
+)
+
+
+def _get_scraper(rebuild: bool = False):
+    """Return the shared cloudscraper session, creating or replacing it under a lock."""
+    global _scraper
+    with _scraper_lock:
+        if _scraper is None or rebuild:
+            # IMPORTANT: use plain cloudscraper.create_scraper() with NO extra arguments.
+            # Passing browser config or custom headers overrides cloudscraper's own
+            # carefully crafted browser emulation and causes 403 errors.
+            _scraper = cloudscraper.create_scraper()
+            for adapter in _scraper.adapters.values():
+                adapter.max_retries = _SCRAPE_RETRY
+        return _scraper
+
+
+def _log_content_encoding_once(response) -> None:
+    """Log the Content-Encoding of the first successful scrape, once per process."""
+    global _encoding_logged
+    with _scraper_lock:
+        if _encoding_logged:
+            return
+        _encoding_logged = True
+    logger.info("Source responses use Content-Encoding: %s",
+                response.headers.get("Content-Encoding", "identity"))
+
+
 def get_metal_prices(metal: str, city: str, force_refresh: bool = False) -> str:
     """
     Main scraping function. Returns a formatted HTML string for Telegram.
@@ -329,9 +699,10 @@ def get_metal_prices(metal: str, city: str, force_refresh: bool = False) -> str:
     metal = metal.lower()
     city  = city.lower()
 
-    if metal not in METALS:
-        raise ValueError(f"Unsupported metal '{metal}'. Use: {', '.join(METALS)}")
-    if city not in CITIES:
+    url = _URL_BY_KEY.get((metal, city))
+    if url is None:
+        if metal not in METALS:
+            raise ValueError(f"Unsupported metal '{metal}'. Use: {', '.join(METALS)}")
         raise ValueError(
             f"Unsupported city '{city}'.\nUse /cities to see the full list."
         )
@@ -340,20 +711,19 @@ def get_metal_prices(metal: str, city: str, force_refresh: bool = False) -> str:
     if not force_refresh:
         cached = _get_cached(metal, city)
         if cached:
-            logger.info("Cache hit for %s/%s", metal, city)
+            logger.debug("Cache hit for %s/%s", metal, city)
             return cached["data"]
 
     metal_info = METALS[metal]
     city_name  = CITIES[city]
-    url = f"https://www.goodreturns.in/{metal_info['url_slug']}/{city}.html"
 
     # --- Network fetch ---
-    # IMPORTANT: use plain cloudscraper.create_scraper() with NO extra arguments.
-    # Passing browser config or custom headers overrides cloudscraper's own
-    # carefully crafted browser emulation and causes 403 errors.
     try:
-        scraper  = cloudscraper.create_scraper()
-        response = scraper.get(url, timeout=15)
+        response = _get_scraper().get(url, timeout=15)
+        if response.status_code == 403:
+            # Cloudflare clearance on the shared session has likely expired
+            logger.info("HTTP 403 for %s, retrying with a fresh scraper", url)
+            response = _get_scraper(rebuild=True).get(url, timeout=15)
     except Exception as exc:
         logger.error("Network error fetching %s: %s", url, exc)
         return (
@@ -370,45 +740,37 @@ def get_metal_prices(metal: str, city: str, force_refresh: bool = False) -> str:
             f"<i>Please try again in a few minutes.</i>"
         )
 
+    _log_content_encoding_once(response)
+
     # --- Parse ---
     try:
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Find the relevant section by checking data-gr-title contains the
-        # metal keyword — more resilient than an exact string match
-        section = None
-        for sec in soup.find_all("section", attrs={"data-gr-title": True}):
-            title = sec.get("data-gr-title", "")
-            if metal_info["section_keyword"].lower() in title.lower():
-                section = sec
-                break
-
-        if not section:
-            raise RuntimeError(
-                f"Could not locate the {metal_info['label']} price section. "
-                "The website layout may have changed."
-            )
-
-        # 'table-conatiner' is a typo on the source website itself
-        table = section.find("table", {"class": "table-conatiner"})
-        if not table:
+        # Hand lxml the raw bytes: it decodes using the page's own charset and
+        # skips building an intermediate str copy of the whole document
+        doc = lxml_html.fromstring(response.content, parser=_html_parser())
+
+        tables = _PRICE_TABLE_XPATH(
+            doc,
+            upper=string.ascii_uppercase,
+            lower=string.ascii_lowercase,
+            keyword=metal_info["section_keyword"].lower(),
+        )
+        if not tables:
             raise RuntimeError(
                 f"Could not find the price table for {metal_info['label']}. "
                 "The website layout may have changed."
             )
+        table = tables[0]
 
-        thead = table.find("thead")
-        tbody = table.find("tbody")
-        if not thead or not tbody:
+        if table.find("thead") is None or table.find("tbody") is None:
             raise RuntimeError("Malformed table structure on the source website.")
 
-        headers = [th.get_text(strip=True) for th in thead.find_all("th")]
+        headers = [th.text_content().strip() for th in _HEADER_CELLS_XPATH(table)]
         if not headers:
             raise RuntimeError("Could not read table headers.")
 
         raw_rows: list[list[str]] = []
-        for tr in tbody.find_all("tr"):
-            cells = [td.get_text(strip=True) for td in tr.find_all("td")]
+        for tr in _BODY_ROWS_XPATH(table):
+            cells = [td.text_content().strip() for td in _ROW_CELLS_XPATH(tr)]
             if len(cells) == len(headers):  # skip malformed / ad rows
                 raw_rows.append(cells)
 
@@ -434,6 +796,7 @@ def get_metal_prices(metal: str, city: str, force_refresh: bool = False) -> str:
         )
 
         _set_cache(metal, city, message, current_price or 0.0)
+        _persist_cache(metal, city, message, current_price or 0.0)
         return message
 
     except RuntimeError as exc:
@@ -451,6 +814,31 @@ def get_metal_prices(metal: str, city: str, force_refresh: bool = False) -> str:
             f"🔗 Check manually: <a href='{url}'>{city_name} {metal_info['label']} Prices</a>"
         )
 
+# Scrapes get their own small pool so a job fan-out can't exhaust the default
+# executor (shared with asyncio.to_thread users) or flood the source site
+_scrape_pool = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape")
+
+# In-flight scrapes keyed by (metal, city); concurrent callers share one task
+_inflight: dict[tuple, asyncio.Future] = {}
+
+
+async def fetch_prices(metal: str, city: str, force_refresh: bool = False) -> str:
+    """
+    Run get_metal_prices() on the scrape pool, coalescing concurrent calls for
+    the same (metal, city) into a single scrape. Raises what it raises.
+    """
+    key  = _cache_key(metal, city)
+    task = _inflight.get(key)
+    if task is None:
+        # No await between the lookup and the insert, so no lock is needed
+        task = asyncio.get_running_loop().run_in_executor(
+            _scrape_pool, get_metal_prices, metal, city, force_refresh
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: one caller being cancelled must not cancel the shared scrape
+    return await asyncio.shield(task)
+
 # ---------------------------------------------------------------------------
 # Helpers for command handlers
 # ---------------------------------------------------------------------------
@@ -470,10 +858,21 @@ async def _fetch_and_reply(
     city: str,
     force: bool = False,
 ) -> None:
-    """Send a loading message, fetch prices, edit with result."""
+    """
+    Reply straight from the cache when it's fresh; otherwise send a loading
+    message, fetch prices and edit it with the result.
+    """
+    cached = None if force else _get_cached(metal, city)
+    if cached:
+        logger.debug("Cache hit for %s/%s", metal, city)
+        await update.message.reply_text(
+            cached["data"], parse_mode="HTML", disable_web_page_preview=True
+        )
+        return
+
     loading = await update.message.reply_text("⏳ Fetching prices, please wait…")
     try:
-        text = get_metal_prices(metal, city, force_refresh=force)
+        text = await fetch_prices(metal, city, force_refresh=force)
         await loading.edit_text(text, parse_mode="HTML", disable_web_page_preview=True)
     except ValueError as exc:
         # Only ValueError is raised now (bad metal/city args)
@@ -486,36 +885,47 @@ async def _fetch_and_reply(
 # Command handlers
 # ---------------------------------------------------------------------------
 
+# Static replies, built once at import (CITIES never changes at runtime)
+_START_TEXT = (
+    "👋 <b>Welcome to the Metal Price Bot!</b>\n\n"
+    "I fetch live gold &amp; silver prices across major Indian cities.\n\n"
+    "Use /help to see all available commands."
+)
+
+_HELP_TEXT = (
+    "📖 <b>Available Commands</b>\n\n"
+    "<b>Prices</b>\n"
+    "/gold [city]     — Gold prices (default: Bangalore)\n"
+    "/silver [city]   — Silver prices (default: Bangalore)\n"
+    "/cities          — List all supported cities\n\n"
+    "<b>Daily Subscription</b>\n"
+    "/subscribe [metal] [city]  — Get prices every day at 9 AM IST\n"
+    "/unsubscribe               — Cancel your daily subscription\n\n"
+    "<b>Price Alerts</b>\n"
+    "/alert &lt;price&gt; [metal] [city]\n"
+    "  — Notify when price drops below threshold\n"
+    "  — Example: /alert 6500 gold bangalore\n"
+    "/myalert      — Show your current alert\n"
+    "/cancelalert  — Remove your alert\n\n"
+    "<b>Other</b>\n"
+    "/status  — Cache age &amp; uptime info\n"
+    "/help    — This message"
+)
+
+_CITY_LIST = "\n".join(f"• {key}  →  {name}" for key, name in CITIES.items())
+_CITIES_TEXT = (
+    "🏙️ <b>Supported Cities</b>\n\n"
+    f"<code>{_CITY_LIST}</code>\n\n"
+    "Usage example: <code>/gold mumbai</code>"
+)
+
+
 async def cmd_start(update: Update, context: CallbackContext) -> None:
-    await update.message.reply_text(
-        "👋 <b>Welcome to the Metal Price Bot!</b>\n\n"
-        "I fetch live gold &amp; silver prices across major Indian cities.\n\n"
-        "Use /help to see all available commands.",
-        parse_mode="HTML",
-    )
+    await update.message.reply_text(_START_TEXT, parse_mode="HTML")
 
 
 async def cmd_help(update: Update, context: CallbackContext) -> None:
-    await update.message.reply_text(
-        "📖 <b>Available Commands</b>\n\n"
-        "<b>Prices</b>\n"
-        "/gold [city]     — Gold prices (default: Bangalore)\n"
-        "/silver [city]   — Silver prices (default: Bangalore)\n"
-        "/cities          — List all supported cities\n\n"
-        "<b>Daily Subscription</b>\n"
-        "/subscribe [metal] [city]  — Get prices every day at 9 AM IST\n"
-        "/unsubscribe               — Cancel your daily subscription\n\n"
-        "<b>Price Alerts</b>\n"
-        "/alert &lt;price&gt; [metal] [city]\n"
-        "  — Notify when price drops below threshold\n"
-        "  — Example: /alert 6500 gold bangalore\n"
-        "/myalert      — Show your current alert\n"
-        "/cancelalert  — Remove your alert\n\n"
-        "<b>Other</b>\n"
-        "/status  — Cache age &amp; uptime info\n"
-        "/help    — This message",
-        parse_mode="HTML",
-    )
+    await update.message.reply_text(_HELP_TEXT, parse_mode="HTML")
 
 
 async def cmd_gold(update: Update, context: CallbackContext) -> None:
@@ -531,13 +941,7 @@ async def cmd_silver(update: Update, context: CallbackContext) -> None:
 
 
 async def cmd_cities(update: Update, context: CallbackContext) -> None:
-    city_list = "\n".join(f"• {key}  →  {name}" for key, name in CITIES.items())
-    await update.message.reply_text(
-        "🏙️ <b>Supported Cities</b>\n\n"
-        f"<code>{city_list}</code>\n\n"
-        "Usage example: <code>/gold mumbai</code>",
-        parse_mode="HTML",
-    )
+    await update.message.reply_text(_CITIES_TEXT, parse_mode="HTML")
 
 
 # --- Subscribe ---
@@ -556,7 +960,7 @@ async def cmd_subscribe(update: Update, context: CallbackContext) -> None:
         metal = DEFAULT_METAL
 
     chat_id = update.effective_chat.id
-    add_subscription(chat_id, city, metal)
+    await asyncio.to_thread(add_subscription, chat_id, city, metal)
     metal_label = METALS[metal]["label"]
     city_label  = CITIES[city]
 
@@ -571,7 +975,7 @@ async def cmd_subscribe(update: Update, context: CallbackContext) -> None:
 
 async def cmd_unsubscribe(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
-    removed = remove_subscription(chat_id)
+    removed = await asyncio.to_thread(remove_subscription, chat_id)
     if removed:
         await update.message.reply_text("✅ You've been unsubscribed from daily price updates.")
     else:
@@ -620,7 +1024,7 @@ async def cmd_alert(update: Update, context: CallbackContext) -> None:
             city = arg
 
     chat_id = update.effective_chat.id
-    set_alert(chat_id, metal, city, threshold)
+    await asyncio.to_thread(set_alert, chat_id, metal, city, threshold)
     metal_label = METALS[metal]["label"]
     city_label  = CITIES[city]
 
@@ -658,7 +1062,7 @@ async def cmd_myalert(update: Update, context: CallbackContext) -> None:
 
 async def cmd_cancelalert(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
-    removed = remove_alert(chat_id)
+    removed = await asyncio.to_thread(remove_alert, chat_id)
     if removed:
         await update.message.reply_text("✅ Your price alert has been removed.")
     else:
@@ -679,14 +1083,14 @@ async def cmd_status(update: Update, context: CallbackContext) -> None:
     if _price_cache:
         lines.append("\n📦 <b>Cache Entries</b>")
         for (metal, city), entry in _price_cache.items():
-            age_secs = int(time.time() - entry["timestamp"])
+            age_secs = int(time.monotonic() - entry["timestamp"])
             age_str  = f"{age_secs // 60}m {age_secs % 60}s ago"
             lines.append(f"• {metal}/{city} — fetched {age_str}")
     else:
         lines.append("📦 Cache: empty")
 
-    sub_count   = len(get_all_subscriptions())
-    alert_count = len(get_all_alerts())
+    sub_count   = count_subscriptions()
+    alert_count = count_alerts()
     lines.append(f"\n👥 Subscriptions: {sub_count}")
     lines.append(f"🔔 Active alerts: {alert_count}")
 
@@ -696,98 +1100,241 @@ async def cmd_status(update: Update, context: CallbackContext) -> None:
 # Background jobs
 # ---------------------------------------------------------------------------
 
+# One limiter for every background sender (daily job, alert sweep and
+# alert_worker()), so together they stay under Telegram's bot-wide limit.
+# Semaphores belong to one event loop, so it is rebuilt if the loop changes.
+_send_limiter: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def _get_send_slots() -> asyncio.Semaphore:
+    global _send_limiter
+    loop = asyncio.get_running_loop()
+    if _send_limiter is None or _send_limiter[0] is not loop:
+        _send_limiter = (loop, asyncio.Semaphore(TELEGRAM_SEND_CONCURRENCY))
+    return _send_limiter[1]
+
+
+async def _send_throttled(bot, messages: list[dict]) -> set[int]:
+    """
+    Send messages concurrently through the shared limiter. Each send keeps its
+    slot for TELEGRAM_SEND_WINDOW after it starts, so at most
+    TELEGRAM_SEND_CONCURRENCY sends go out per window across all callers; the
+    slot is released by a timer, so the caller doesn't wait out the window.
+    A 429 RetryAfter is waited out and resent. Other failures are logged.
+    Each item holds the keyword arguments for bot.send_message().
+    Returns the chat_ids that were delivered.
+    """
+    loop  = asyncio.get_running_loop()
+    slots = _get_send_slots()
+
+    async def send_one(kwargs: dict) -> bool:
+        await slots.acquire()
+        started = loop.time()
+        try:
+            for attempt in range(TELEGRAM_SEND_RETRIES + 1):
+                try:
+                    await bot.send_message(**kwargs)
+                    return True
+                except RetryAfter as exc:
+                    if attempt == TELEGRAM_SEND_RETRIES:
+                        logger.warning("Giving up on %s after %d rate-limit retries",
+                                       kwargs["chat_id"], attempt)
+                        return False
+                    delay = exc.retry_after
+                    if isinstance(delay, datetime.timedelta):
+                        delay = delay.total_seconds()
+                    logger.info("Rate limited; resending to %s in %ss", kwargs["chat_id"], delay)
+                    await asyncio.sleep(delay)
+                except Exception as exc:
+                    logger.warning("Failed to send message to %s: %s", kwargs["chat_id"], exc)
+                    return False
+        finally:
+            hold = TELEGRAM_SEND_WINDOW - (loop.time() - started)
+            loop.call_later(max(0.0, hold), slots.release)
+
+    results = await asyncio.gather(*(send_one(kwargs) for kwargs in messages))
+    return {kwargs["chat_id"] for kwargs, sent in zip(messages, results) if sent}
+
+
 async def job_daily_prices(context: CallbackContext) -> None:
     """Runs daily at 9 AM IST. Sends prices to all subscribers."""
     subs = get_all_subscriptions()
     logger.info("Daily job: sending to %d subscribers", len(subs))
-    for sub in subs:
-        chat_id = sub["chat_id"]
-        metal   = sub["metal"]
-        city    = sub["city"]
-        try:
-            msg = get_metal_prices(metal, city)
-            header = (
+
+    # Scrape each distinct (metal, city) once, concurrently and off the event
+    # loop, instead of once per subscriber
+    pairs   = list({(sub["metal"], sub["city"]) for sub in subs})
+    results = await asyncio.gather(
+        *(fetch_prices(metal, city) for metal, city in pairs),
+        return_exceptions=True,
+    )
+    # Full message text per pair, so subscribers sharing a pair share one string
+    texts: dict[tuple, str] = {}
+    for (metal, city), result in zip(pairs, results):
+        if isinstance(result, Exception):
+            logger.warning("Daily job scrape failed for %s/%s: %s", metal, city, result)
+        else:
+            texts[(metal, city)] = (
                 f"🌅 <b>Good morning! Your daily {METALS[metal]['label']} update:</b>\n\n"
+                + result
             )
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=header + msg,
-                parse_mode="HTML",
-                disable_web_page_preview=True,
-            )
-        except Exception as exc:
-            logger.warning("Failed to send daily update to %s: %s", chat_id, exc)
 
+    messages: list[dict] = []
+    for sub in subs:
+        text = texts.get((sub["metal"], sub["city"]))
+        if text is None:
+            continue
+        messages.append({
+            "chat_id": sub["chat_id"],
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        })
+
+    await _send_throttled(context.bot, messages)
 
-async def job_check_alerts(context: CallbackContext) -> None:
-    """Runs every hour. Fires alerts when price drops below threshold."""
-    alerts = get_all_alerts()
-    if not alerts:
-        return
 
-    logger.info("Alert check: %d active alerts", len(alerts))
+def _collect_alert_messages(metal: str, city: str, current_price: float | None) -> list[dict]:
+    """
+    Build send_message kwargs for every alert on (metal, city) that the
+    current price triggers.
+    """
+    if current_price is None or current_price <= 0:
+        return []
+
+    metal_label = METALS[metal]["label"]
+    city_label  = CITIES.get(city, city.title())
+
+    # The threshold comparison runs in SQL; only triggered rows come back
+    return [
+        {
+            "chat_id": alert["chat_id"],
+            "text": (
+                f"🔔 <b>Price Alert Triggered!</b>\n\n"
+                f"{METALS[metal]['emoji']} <b>{metal_label}</b> in <b>{city_label}</b> "
+                f"is now <b>₹{current_price:,.2f}</b>, which is below your "
+                f"threshold of <b>₹{alert['threshold']:,.2f}</b>.\n\n"
+                f"Use /cancelalert if you no longer need this alert."
+            ),
+            "parse_mode": "HTML",
+        }
+        for alert in get_triggered_alerts(metal, city, current_price)
+    ]
 
-    # Group by (metal, city) to minimise scrape calls
-    groups: dict[tuple, list[dict]] = {}
-    for alert in alerts:
-        key = (alert["metal"], alert["city"])
-        groups.setdefault(key, []).append(alert)
 
-    for (metal, city), group_alerts in groups.items():
-        # Use cached price if available; otherwise scrape fresh
-        cached = _get_cached(metal, city)
-        current_price: float | None = cached["price"] if cached else None
-
-        if current_price is None:
-            try:
-                get_metal_prices(metal, city)  # populates cache as side-effect
-                cached = _get_cached(metal, city)
-                current_price = cached["price"] if cached else None
-            except Exception as exc:
-                logger.warning("Alert check scrape failed for %s/%s: %s", metal, city, exc)
-                continue
-
-        if current_price is None or current_price <= 0:
+async def job_check_alerts(context: CallbackContext) -> None:
+    """
+    Safety net behind alert_worker(): runs every ALERT_CHECK_INTERVAL,
+    scrapes groups nobody has looked at recently (their alerts go out through
+    the price event) and queues the rest at their cached price.
+    """
+    groups = {(g["metal"], g["city"]): g["max_threshold"] for g in get_alert_groups()}
+    if not groups:
+        return
+
+    logger.info("Alert check: %d (metal, city) groups", len(groups))
+
+    # Scrape every group without a usable cached price concurrently, off the
+    # event loop; get_metal_prices() populates the cache as a side-effect.
+    # force_refresh: a fresh entry without a price would otherwise just be
+    # returned from the cache again.
+    missing = [key for key in groups if _cached_price(*key) is None]
+    if missing:
+        results = await asyncio.gather(
+            *(fetch_prices(metal, city, force_refresh=True) for metal, city in missing),
+            return_exceptions=True,
+        )
+        for (metal, city), result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.warning("Alert check scrape failed for %s/%s: %s", metal, city, result)
+
+    # Groups scraped above published a price event from _set_cache(); the
+    # rest are queued here, so alert_worker() is the only thing sending alerts
+    scraped = set(missing)
+    queued  = 0
+    for (metal, city), max_threshold in groups.items():
+        if (metal, city) in scraped:
             continue
+        current_price = _cached_price(metal, city)
+        if current_price is None or current_price >= max_threshold:
+            continue  # no alert in this group can fire
+        _price_events.put_nowait((metal, city, current_price))
+        queued += 1
 
-        metal_label = METALS[metal]["label"]
-        city_label  = CITIES.get(city, city.title())
+    if queued:
+        logger.info("Alert check: queued %d groups for the alert worker", queued)
 
-        for alert in group_alerts:
-            if current_price < alert["threshold"]:
-                chat_id   = alert["chat_id"]
-                threshold = alert["threshold"]
-                try:
-                    await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=(
-                            f"🔔 <b>Price Alert Triggered!</b>\n\n"
-                            f"{METALS[metal]['emoji']} <b>{metal_label}</b> in <b>{city_label}</b> "
-                            f"is now <b>₹{current_price:,.2f}</b>, which is below your "
-                            f"threshold of <b>₹{threshold:,.2f}</b>.\n\n"
-                            f"Use /cancelalert if you no longer need this alert."
-                        ),
-                        parse_mode="HTML",
-                    )
-                    logger.info(
-                        "Alert fired for chat_id=%s (%s/%s < %.2f)",
-                        chat_id, metal, city, threshold,
-                    )
-                except Exception as exc:
-                    logger.warning("Failed to send alert to %s: %s", chat_id, exc)
+
+async def alert_worker(bot) -> None:
+    """
+    Long-running task and the only alert sender: checks alerts for each price
+    published by a scrape or queued by the job_check_alerts safety net.
+    Handling one event at a time means a chat is marked notified at a price
+    before the next event for that price is read, so refreshes and sweeps at
+    an unchanged price don't repeat alerts.
+    """
+    while True:
+        metal, city, price = await _price_events.get()
+        try:
+            messages = _collect_alert_messages(metal, city, price)
+            if messages:
+                logger.info("Price event %s/%s: firing %d alerts", metal, city, len(messages))
+                delivered = await _send_throttled(bot, messages)
+                if delivered:
+                    # Only delivered chats are marked; failed sends retry on the next event
+                    await asyncio.to_thread(mark_alerts_notified, metal, city, delivered, price)
+        except Exception as exc:
+            logger.exception("Alert worker failed for %s/%s: %s", metal, city, exc)
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
-def main() -> None:
-    init_db()
+_alert_worker_task: asyncio.Task | None = None
+_health_server: asyncio.Server | None = None
+
+
+async def _post_init(application: Application) -> None:
+    """Bind the price-event queue to the bot's loop and start alert_worker()."""
+    global _event_loop, _price_events, _alert_worker_task
+    _event_loop   = asyncio.get_running_loop()
+    _price_events = asyncio.Queue()
+    _alert_worker_task = asyncio.create_task(alert_worker(application.bot))
 
-    # Flask health-check in daemon thread
-    server_thread = threading.Thread(target=start_flask_server, daemon=True)
-    server_thread.start()
 
-    application = Application.builder().token(TOKEN).build()
+async def _post_shutdown(application: Application) -> None:
+    global _event_loop
+    _event_loop = None  # stop scrapes from queueing onto a closing loop
+    if _alert_worker_task is not None:
+        _alert_worker_task.cancel()
+    if _health_server is not None:
+        _health_server.close()
+
+
+def main() -> None:
+    global _health_server
+    log_listener = _start_log_listener()
+    init_db()
+    logger.info("Restored %d cached price entries", load_persisted_cache())
+
+    if uvloop is not None:
+        # Must be installed before the Application creates its event loop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+
+    # Open the health-check port first, on the loop run_polling() picks up via
+    # get_event_loop(): the host's port check must not wait on Telegram's getMe
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    _health_server = _open_health_port(loop)
+
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     # Register command handlers
     application.add_handler(CommandHandler("start",        cmd_start))
@@ -810,23 +1357,34 @@ def main() -> None:
             "     Ensure your requirements.txt has:  python-telegram-bot[job-queue]"
         )
     else:
-        # 9:00 AM IST = 03:30 UTC
+        # 9:00 AM IST = 03:30 UTC, plus a random per-process offset so a fleet
+        # of restarts doesn't hit the source site at the same second
+        daily_at = (
+            datetime.datetime.combine(datetime.date.today(), datetime.time(3, 30))
+            + datetime.timedelta(seconds=random.randint(0, DAILY_JOB_JITTER))
+        ).time().replace(tzinfo=datetime.timezone.utc)
         application.job_queue.run_daily(
             job_daily_prices,
-            time=datetime.time(3, 30, 0, tzinfo=datetime.timezone.utc),
+            time=daily_at,
             name="daily_prices",
         )
-        # Alert check every hour
+        # Safety-net alert sweep; price events trigger alerts in between
         application.job_queue.run_repeating(
             job_check_alerts,
             interval=ALERT_CHECK_INTERVAL,
             first=60,
             name="alert_check",
         )
-        logger.info("JobQueue active: daily prices at 09:00 IST, alerts every %ds.", ALERT_CHECK_INTERVAL)
+        logger.info(
+            "JobQueue active: daily prices at %s UTC, alerts every %ds.",
+            daily_at.strftime("%H:%M:%S"), ALERT_CHECK_INTERVAL,
+        )
 
     logger.info("Bot started. Polling for updates…")
-    application.run_polling()
+    try:
+        application.run_polling()
+    finally:
+        log_listener.stop()  # flush queued records before exit
 
 
 if __name__ == "__main__":
@@ -16,23 +16,13 @@ import importlib.util
 # ── We load only the modules we can actually import ──────────────────────────
 # Stub out missing third-party deps so we can import gold_bot logic
 import types
-for stub in ("flask", "cloudscraper", "bs4", "telegram", "telegram.ext"):
+for stub in ("cloudscraper", "lxml", "lxml.etree", "lxml.html", "telegram", "telegram.ext",
+             "telegram.error", "urllib3", "urllib3.util"):
     if stub not in sys.modules:
         mod = types.ModuleType(stub)
         sys.modules[stub] = mod
 
 # Provide the bare minimum fakes so gold_bot.py imports cleanly
-flask_mod = sys.modules["flask"]
-
-class _FakeFlask:
-    def route(self, *a, **kw):
-        return lambda fn: fn
-    def run(self, *a, **kw):
-        pass
-
-flask_mod.Flask    = lambda *a, **kw: _FakeFlask()   # type: ignore
-flask_mod.jsonify  = lambda *a, **kw: {}             # type: ignore
-
 telegram_ext = sys.modules["telegram.ext"]
 for cls in ("Application", "CommandHandler", "CallbackContext"):
     setattr(telegram_ext, cls, type(cls, (), {}))
@@ -40,11 +30,28 @@ for cls in ("Application", "CommandHandler", "CallbackContext"):
 telegram_mod = sys.modules["telegram"]
 telegram_mod.Update = type("Update", (), {})  # type: ignore
 
+telegram_error = sys.modules["telegram.error"]
+if not hasattr(telegram_error, "RetryAfter"):
+    class _RetryAfter(Exception):
+        def __init__(self, retry_after):
+            super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+            self.retry_after = retry_after
+    telegram_error.RetryAfter = _RetryAfter  # type: ignore
+
 cloudscraper_mod = sys.modules["cloudscraper"]
 cloudscraper_mod.create_scraper = lambda: None  # type: ignore
 
-bs4_mod = sys.modules["bs4"]
-bs4_mod.BeautifulSoup = None  # type: ignore
+lxml_html_mod = sys.modules["lxml.html"]
+lxml_html_mod.fromstring = None  # type: ignore
+sys.modules["lxml"].html = lxml_html_mod  # type: ignore
+
+urllib3_util_mod = sys.modules["urllib3.util"]
+if not hasattr(urllib3_util_mod, "Retry"):
+    urllib3_util_mod.Retry = lambda *a, **kw: None  # type: ignore
+
+lxml_etree_mod = sys.modules["lxml.etree"]
+lxml_etree_mod.XPath = lambda *a, **kw: None  # type: ignore
+sys.modules["lxml"].etree = lxml_etree_mod  # type: ignore
 
 # Now we can safely import our module
 os.environ.setdefault("TOKEN", "fake-token-for-tests")
@@ -97,12 +104,21 @@ class TestConstants(unittest.TestCase):
         self.assertIn(bot.DEFAULT_CITY,  bot.CITIES)
         self.assertIn(bot.DEFAULT_METAL, bot.METALS)
 
+    def test_url_table_covers_every_pair(self):
+        self.assertEqual(len(bot._URL_BY_KEY), len(bot.METALS) * len(bot.CITIES))
+        self.assertEqual(bot._URL_BY_KEY[("gold", "pune")],
+                         "https://www.goodreturns.in/gold-rates/pune.html")
+
     def test_cache_ttl_positive(self):
         self.assertGreater(bot.CACHE_TTL, 0)
 
     def test_alert_interval_positive(self):
         self.assertGreater(bot.ALERT_CHECK_INTERVAL, 0)
 
+    def test_cities_reply_lists_every_city(self):
+        for key, name in bot.CITIES.items():
+            self.assertIn(f"• {key}  →  {name}", bot._CITIES_TEXT)
+
 
 class TestParsePriceFromCell(unittest.TestCase):
     """Unit tests for the price-parsing helper."""
@@ -126,6 +142,51 @@ class TestParsePriceFromCell(unittest.TestCase):
     def test_commas_stripped(self):
         self.assertAlmostEqual(bot._parse_price_from_cell("₹1,00,000"), 100000.0)
 
+    def test_non_breaking_space_after_rupee(self):
+        self.assertAlmostEqual(bot._parse_price_from_cell("₹\u00a07,940"), 7940.0)
+
+    def test_tab_or_newline_before_trailing_text(self):
+        self.assertAlmostEqual(bot._parse_price_from_cell("₹7,940\n(22K)"), 7940.0)
+        self.assertAlmostEqual(bot._parse_price_from_cell("\t6,000\tINR"), 6000.0)
+
+
+class TestDisplayLen(unittest.TestCase):
+    """Unit tests for the display-width helper."""
+
+    def test_ascii_is_one_per_char(self):
+        self.assertEqual(bot._display_len("Gram"), 4)
+
+    def test_emoji_is_two(self):
+        self.assertEqual(bot._display_len("🔴"), 2)
+        self.assertEqual(bot._display_len("🟢 +20"), 6)
+
+    def test_rupee_sign_is_narrow(self):
+        self.assertEqual(bot._display_len("₹6,000"), 6)
+
+    def test_range_boundaries_inclusive(self):
+        self.assertEqual(bot._display_len("ᄀ"), 2)
+        self.assertEqual(bot._display_len("ᅟ"), 2)
+        self.assertEqual(bot._display_len("ᅠ"), 1)
+        self.assertEqual(bot._display_len("ჿ"), 1)
+
+    def test_empty_string(self):
+        self.assertEqual(bot._display_len(""), 0)
+
+
+class TestCellWidth(unittest.TestCase):
+    """The table fast path must agree with _display_len on table content."""
+
+    def test_matches_display_len_for_table_cells(self):
+        for cell in ("Gram", "₹7,94,000", "🔴 - ₹70", "🟢 +20", ""):
+            self.assertEqual(bot._cell_width(cell), bot._display_len(cell), cell)
+
+    def test_pad_right_reaches_display_width(self):
+        self.assertEqual(bot._display_len(bot._pad_right("🔴 -10", 10)), 10)
+
+    def test_pad_center_puts_extra_space_on_the_right(self):
+        self.assertEqual(bot._pad_center("ab", 5), " ab  ")
+        self.assertEqual(bot._display_len(bot._pad_center("🟢 +5", 9)), 9)
+
 
 class TestBuildTableStr(unittest.TestCase):
     """Unit tests for the table-building helper."""
@@ -259,6 +320,52 @@ class TestGetMetalPricesValidation(unittest.TestCase):
             pass  # RuntimeError from network is expected in sandbox
 
 
+class TestSharedScraper(unittest.TestCase):
+    """The cloudscraper session is created once and rebuilt only on 403."""
+
+    def setUp(self):
+        from unittest import mock
+        bot._scraper = None
+        bot._price_cache.clear()
+        self.created = []
+
+        class _FakeScraper:
+            def __init__(inner, status):
+                inner.status = status
+                inner.adapters = {"https://": _types.SimpleNamespace(max_retries=0)}
+                self.created.append(inner)
+
+            def get(inner, url, timeout=None):
+                return _types.SimpleNamespace(status_code=inner.status, text="")
+
+        self._FakeScraper = _FakeScraper
+        self._mock = mock
+
+    def tearDown(self):
+        bot._scraper = None
+
+    def test_scraper_reused_across_calls(self):
+        with self._mock.patch.object(bot.cloudscraper, "create_scraper",
+                                     lambda: self._FakeScraper(500), create=True):
+            bot.get_metal_prices("gold", "delhi")
+            bot.get_metal_prices("gold", "pune")
+        self.assertEqual(len(self.created), 1)
+
+    def test_scraper_rebuilt_after_403(self):
+        statuses = iter([403, 500])
+        with self._mock.patch.object(bot.cloudscraper, "create_scraper",
+                                     lambda: self._FakeScraper(next(statuses)), create=True):
+            result = bot.get_metal_prices("gold", "delhi")
+        self.assertEqual(len(self.created), 2)
+        self.assertIn("HTTP 500", result)
+
+    def test_scraper_adapters_retry_transient_errors(self):
+        with self._mock.patch.object(bot.cloudscraper, "create_scraper",
+                                     lambda: self._FakeScraper(200), create=True):
+            scraper = bot._get_scraper()
+        self.assertIs(scraper.adapters["https://"].max_retries, bot._SCRAPE_RETRY)
+
+
 class TestCache(unittest.TestCase):
     """Unit tests for the price cache."""
 
@@ -292,6 +399,38 @@ class TestCache(unittest.TestCase):
         self.assertEqual(bot._get_cached("gold",   "delhi")["data"], "gold msg")
         self.assertEqual(bot._get_cached("silver", "delhi")["data"], "silver msg")
 
+    def test_cached_price_read_directly(self):
+        bot._set_cache("gold", "delhi", "msg", 6000.0)
+        self.assertEqual(bot._cached_price("gold", "delhi"), 6000.0)
+
+    def test_cached_price_not_guessed_from_message(self):
+        # Today unparseable: the next rupee amount is Yesterday's, not a price to alert on
+        message = "<pre><code>Gram | Today | Yesterday\n1    | N/A   | ₹8,010</code></pre>"
+        bot._set_cache("gold", "delhi", message, 0.0)
+        self.assertIsNone(bot._cached_price("gold", "delhi"))
+        self.assertEqual(bot._get_cached("gold", "delhi")["price"], 0.0)
+
+    def test_cached_price_none_when_missing_or_unparseable(self):
+        self.assertIsNone(bot._cached_price("gold", "delhi"))
+        bot._set_cache("gold", "delhi", "⚠️ no prices", 0.0)
+        self.assertIsNone(bot._cached_price("gold", "delhi"))
+
+    def test_cache_bounded_to_metal_city_pairs(self):
+        for metal in bot.METALS:
+            for city in bot.CITIES:
+                bot._set_cache(metal, city, "msg", 1.0)
+        bot._set_cache("gold", "bangalore", "again", 1.0)
+        self.assertEqual(len(bot._price_cache), len(bot.METALS) * len(bot.CITIES))
+
+    def test_least_recently_used_evicted_first(self):
+        cache = bot._PriceCache(maxsize=2)
+        cache.put(("gold", "delhi"), {"timestamp": bot.time.monotonic()})
+        cache.put(("gold", "pune"),  {"timestamp": bot.time.monotonic()})
+        cache.get_fresh(("gold", "delhi"), bot.CACHE_TTL)   # touch → most recent
+        cache.put(("gold", "surat"), {"timestamp": bot.time.monotonic()})
+        keys = [key for key, _ in cache.items()]
+        self.assertEqual(keys, [("gold", "delhi"), ("gold", "surat")])
+
 
 class TestDatabase(unittest.TestCase):
     """Integration tests for the SQLite DB layer."""
@@ -338,6 +477,13 @@ class TestDatabase(unittest.TestCase):
         subs = bot.get_all_subscriptions()
         self.assertEqual(len(subs), 2)
 
+    def test_counts(self):
+        bot.add_subscription(1, "mumbai", "gold")
+        bot.add_subscription(2, "delhi",  "silver")
+        bot.set_alert(1, "gold", "bangalore", 6000.0)
+        self.assertEqual(bot.count_subscriptions(), 2)
+        self.assertEqual(bot.count_alerts(), 1)
+
     def test_get_subscription_not_found(self):
         self.assertIsNone(bot.get_subscription(777))
 
@@ -392,6 +538,80 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNone(bot.get_subscription(50))
         self.assertIsNotNone(bot.get_alert(50))  # alert still present
 
+    def test_alert_groups_carry_max_threshold(self):
+        bot.set_alert(1, "gold",   "bangalore", 6000.0)
+        bot.set_alert(2, "gold",   "bangalore", 6500.0)
+        bot.set_alert(3, "silver", "mumbai",    70000.0)
+        groups = {(g["metal"], g["city"]): g["max_threshold"] for g in bot.get_alert_groups()}
+        self.assertEqual(groups, {("gold", "bangalore"): 6500.0, ("silver", "mumbai"): 70000.0})
+
+    def test_triggered_alerts_filtered_in_sql(self):
+        bot.set_alert(1, "gold",   "bangalore", 6000.0)
+        bot.set_alert(2, "gold",   "bangalore", 6500.0)
+        bot.set_alert(3, "gold",   "mumbai",    9000.0)
+        bot.set_alert(4, "silver", "bangalore", 9000.0)
+        fired = bot.get_triggered_alerts("gold", "bangalore", 6200.0)
+        self.assertEqual([a["chat_id"] for a in fired], [2])
+
+    def test_triggered_alerts_exclude_equal_threshold(self):
+        bot.set_alert(1, "gold", "bangalore", 6500.0)
+        self.assertEqual(bot.get_triggered_alerts("gold", "bangalore", 6500.0), [])
+
+    # --- Persisted price cache ---
+
+    def test_save_and_restore_cached_price(self):
+        bot._price_cache.clear()
+        bot.save_cached_price("gold", "pune", "pune msg", 7000.0, bot.time.time())
+        self.assertEqual(bot.load_persisted_cache(), 1)
+        entry = bot._get_cached("gold", "pune")
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry["data"],  "pune msg")
+        self.assertEqual(entry["price"], 7000.0)
+
+    def test_stale_persisted_price_not_restored(self):
+        bot._price_cache.clear()
+        stale = bot.time.time() - bot.CACHE_TTL - 60
+        bot.save_cached_price("gold", "pune", "old msg", 7000.0, stale)
+        self.assertEqual(bot.load_persisted_cache(), 0)
+        self.assertIsNone(bot._get_cached("gold", "pune"))
+
+    def test_saved_price_replaces_previous_row(self):
+        bot.save_cached_price("gold", "pune", "first",  7000.0, bot.time.time())
+        bot.save_cached_price("gold", "pune", "second", 7100.0, bot.time.time())
+        rows = bot.get_cached_prices_since(0)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["message"], "second")
+
+    # --- Connection reuse ---
+
+    def test_connection_reused_within_thread(self):
+        self.assertIs(bot.get_db_connection(), bot.get_db_connection())
+
+    def test_connection_reopened_when_db_path_changes(self):
+        first = bot.get_db_connection()
+        other = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        other.close()
+        try:
+            bot.DB_PATH = other.name
+            self.assertIsNot(bot.get_db_connection(), first)
+        finally:
+            bot.DB_PATH = self._tmp.name
+            os.unlink(other.name)
+
+    def test_wal_journal_mode_enabled(self):
+        mode = bot.get_db_connection().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode.lower(), "wal")
+
+    def test_failed_write_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with bot.db() as conn:
+                conn.execute(
+                    "INSERT INTO subscriptions (chat_id, city, metal, created_at) "
+                    "VALUES (1, 'delhi', 'gold', 'now')"
+                )
+                raise RuntimeError("boom")
+        self.assertIsNone(bot.get_subscription(1))
+
 
 class TestAlertFireLogic(unittest.TestCase):
     """
@@ -415,6 +635,176 @@ class TestAlertFireLogic(unittest.TestCase):
         self.assertTrue(self._should_fire(6499.99, 6500.0))
 
 
+class TestEventDrivenAlerts(unittest.TestCase):
+    """Fresh prices are published to the alert worker and checked against alerts."""
+
+    def setUp(self):
+        self._tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self._tmp.close()
+        bot.DB_PATH = self._tmp.name
+        bot.init_db()
+
+    def tearDown(self):
+        bot._event_loop   = None
+        bot._price_events = None
+        os.unlink(self._tmp.name)
+
+    def test_collect_only_triggered_alerts(self):
+        bot.set_alert(1, "gold", "delhi", 6500.0)
+        bot.set_alert(2, "gold", "delhi", 5500.0)
+        messages = bot._collect_alert_messages("gold", "delhi", 6000.0)
+        self.assertEqual([m["chat_id"] for m in messages], [1])
+
+    def test_notified_alert_skipped_until_price_changes(self):
+        bot.set_alert(1, "gold", "delhi", 6500.0)
+        bot.mark_alerts_notified("gold", "delhi", {1}, 6000.0)
+        self.assertEqual(bot._collect_alert_messages("gold", "delhi", 6000.0), [])
+        self.assertEqual(len(bot._collect_alert_messages("gold", "delhi", 5900.0)), 1)
+
+    def test_changing_alert_clears_notified_price(self):
+        bot.set_alert(1, "gold", "delhi", 6500.0)
+        bot.mark_alerts_notified("gold", "delhi", {1}, 6000.0)
+        bot.set_alert(1, "gold", "delhi", 6400.0)
+        self.assertEqual(len(bot._collect_alert_messages("gold", "delhi", 6000.0)), 1)
+
+    def test_set_cache_publishes_from_worker_thread(self):
+        import threading
+
+        async def scenario():
+            bot._event_loop   = bot.asyncio.get_running_loop()
+            bot._price_events = bot.asyncio.Queue()
+            worker = threading.Thread(
+                target=bot._set_cache, args=("Gold", "Delhi", "msg", 6000.0)
+            )
+            worker.start()
+            worker.join()
+            return await bot.asyncio.wait_for(bot._price_events.get(), timeout=1)
+
+        self.assertEqual(bot.asyncio.run(scenario()), ("gold", "delhi", 6000.0))
+
+    def _with_worker(self, body, fake_bot=None, fake_prices=None):
+        """
+        Run body() with _post_init's alert_worker() live, like the bot, then let
+        queued price events drain. Returns (chats sent to, alert row queries).
+        """
+        from unittest import mock
+        fake_bot    = fake_bot or TestSendThrottled._FakeBot()
+        application = _types.SimpleNamespace(bot=fake_bot)
+
+        async def scenario():
+            await bot._post_init(application)
+            try:
+                await body(_types.SimpleNamespace(bot=fake_bot))
+                for _ in range(20):  # let queued price events reach the worker
+                    await bot.asyncio.sleep(0.01)
+            finally:
+                await bot._post_shutdown(application)
+
+        with mock.patch.object(bot, "get_metal_prices", side_effect=fake_prices), \
+             mock.patch.object(bot, "get_triggered_alerts",
+                               wraps=bot.get_triggered_alerts) as triggered:
+            bot.asyncio.run(scenario())
+        return fake_bot.sent, triggered.call_count
+
+    def _run_sweep(self, fake_prices=None):
+        return self._with_worker(bot.job_check_alerts, fake_prices=fake_prices)
+
+    @staticmethod
+    def _scrape_at(price, calls=None):
+        def fake_prices(metal, city, force_refresh=False):
+            if calls is not None:
+                calls.append(force_refresh)
+            bot._set_cache(metal, city, "msg", price)
+            return "msg"
+        return fake_prices
+
+    def test_sweep_skips_group_priced_above_every_threshold(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold", "delhi", 6000.0)
+        bot._set_cache("gold", "delhi", "msg", 7000.0)
+        self.assertEqual(self._run_sweep(), ([], 0))
+
+    def test_sweep_fires_when_price_below_max_threshold(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold", "delhi", 6000.0)
+        bot.set_alert(2, "gold", "delhi", 7500.0)
+        bot._set_cache("gold", "delhi", "msg", 7000.0)
+        self.assertEqual(self._run_sweep(), ([2], 1))
+
+    def test_sweep_rescrapes_group_cached_without_price(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold", "delhi", 6000.0)
+        bot._set_cache("gold", "delhi", "msg", 0.0)
+        calls = []
+        sent, _ = self._run_sweep(self._scrape_at(5000.0, calls))
+        self.assertEqual(calls, [True])
+        self.assertEqual(sent, [1])  # once, via the price event — not again by the sweep
+
+    def test_sweep_with_worker_alerts_cached_and_scraped_groups_once(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold",   "delhi", 6000.0)   # scraped by the sweep
+        bot.set_alert(2, "silver", "pune",  80000.0)  # fresh cached price
+        bot._set_cache("silver", "pune", "msg", 75000.0)
+        sent, _ = self._run_sweep(self._scrape_at(5000.0))
+        self.assertEqual(sorted(sent), [1, 2])
+
+    def test_forced_refreshes_at_same_price_alert_once(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold", "delhi", 6000.0)
+        bot.set_alert(2, "gold", "delhi", 6500.0)
+
+        async def three_refreshes(context):
+            for _ in range(3):
+                await bot.fetch_prices("gold", "delhi", force_refresh=True)
+                await bot.asyncio.sleep(0.05)
+
+        sent, _ = self._with_worker(three_refreshes, fake_prices=self._scrape_at(5000.0))
+        self.assertEqual(sorted(sent), [1, 2])
+
+    def test_new_price_alerts_again(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold", "delhi", 6000.0)
+        prices = iter([5000.0, 5000.0, 4900.0])
+
+        def fake_prices(metal, city, force_refresh=False):
+            bot._set_cache(metal, city, "msg", next(prices))
+            return "msg"
+
+        async def three_refreshes(context):
+            for _ in range(3):
+                await bot.fetch_prices("gold", "delhi", force_refresh=True)
+                await bot.asyncio.sleep(0.05)
+
+        sent, _ = self._with_worker(three_refreshes, fake_prices=fake_prices)
+        self.assertEqual(sent, [1, 1])
+
+    def test_failed_send_retried_on_next_event(self):
+        bot._price_cache.clear()
+        bot.set_alert(1, "gold", "delhi", 6000.0)
+        fake_bot = TestSendThrottled._FakeBot(fail_for={1})
+
+        async def refresh_then_recover(context):
+            await bot.fetch_prices("gold", "delhi", force_refresh=True)
+            await bot.asyncio.sleep(0.05)
+            fake_bot.fail_for.clear()
+            await bot.fetch_prices("gold", "delhi", force_refresh=True)
+
+        sent, _ = self._with_worker(refresh_then_recover, fake_bot=fake_bot,
+                                    fake_prices=self._scrape_at(5000.0))
+        self.assertEqual(sent, [1])
+
+    def test_publish_is_noop_without_event_loop(self):
+        bot._set_cache("gold", "delhi", "msg", 6000.0)  # must not raise
+
+    def test_publish_after_loop_closed_does_not_raise(self):
+        loop = bot.asyncio.new_event_loop()
+        bot._event_loop   = loop
+        bot._price_events = bot.asyncio.Queue()
+        loop.close()
+        bot._set_cache("gold", "delhi", "msg", 6000.0)  # must not raise
+        self.assertEqual(bot._cached_price("gold", "delhi"), 6000.0)
+
+
 class TestCommandHandlersRegistered(unittest.TestCase):
     """Verify all expected handlers are defined as async functions."""
 
@@ -457,6 +847,264 @@ class TestJobsRegistered(unittest.TestCase):
             self.assertTrue(asyncio.iscoroutinefunction(fn), f"'{name}' must be async def")
 
 
+class TestSendThrottled(unittest.TestCase):
+    """Verify the throttled Telegram fan-out used by background jobs."""
+
+    class _FakeBot:
+        _real_sleep = staticmethod(bot.asyncio.sleep)
+
+        def __init__(self, fail_for=(), rate_limited=None):
+            self.sent         = []
+            self.fail_for     = set(fail_for)
+            self.rate_limited = dict(rate_limited or {})  # chat_id -> 429s before success
+            self.in_flight    = 0
+            self.peak         = 0
+
+        async def send_message(self, **kwargs):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await self._real_sleep(0)
+            self.in_flight -= 1
+            chat_id = kwargs["chat_id"]
+            if chat_id in self.fail_for:
+                raise RuntimeError("blocked by user")
+            if self.rate_limited.get(chat_id):
+                self.rate_limited[chat_id] -= 1
+                raise bot.RetryAfter(5)
+            self.sent.append(chat_id)
+
+    def _run(self, coro_factory, concurrency, window=0.0):
+        from unittest import mock
+        with mock.patch.object(bot, "TELEGRAM_SEND_CONCURRENCY", concurrency), \
+             mock.patch.object(bot, "TELEGRAM_SEND_WINDOW", window), \
+             mock.patch.object(bot.asyncio, "sleep", mock.AsyncMock()) as sleep:
+            result = bot.asyncio.run(coro_factory())
+        return result, sleep
+
+    @staticmethod
+    def _messages(ids):
+        return [{"chat_id": i, "text": "x"} for i in ids]
+
+    def test_all_messages_sent(self):
+        fake = self._FakeBot()
+        delivered, _ = self._run(lambda: bot._send_throttled(fake, self._messages(range(5))), 2)
+        self.assertEqual(sorted(fake.sent), [0, 1, 2, 3, 4])
+        self.assertEqual(delivered, {0, 1, 2, 3, 4})
+
+    def test_in_flight_sends_bounded(self):
+        fake = self._FakeBot()
+        self._run(lambda: bot._send_throttled(fake, self._messages(range(10))), 3)
+        self.assertEqual(fake.peak, 3)
+
+    def test_limiter_shared_across_concurrent_callers(self):
+        fake = self._FakeBot()
+
+        async def two_senders():
+            await bot.asyncio.gather(
+                bot._send_throttled(fake, self._messages(range(5))),
+                bot._send_throttled(fake, self._messages(range(5, 10))),
+            )
+
+        self._run(two_senders, 3)
+        self.assertEqual(fake.peak, 3)
+        self.assertEqual(len(fake.sent), 10)
+
+    def test_slot_held_for_window_after_send(self):
+        async def send_then_check():
+            await bot._send_throttled(self._FakeBot(), self._messages(range(2)))
+            return bot._get_send_slots().locked()
+
+        still_held, _ = self._run(send_then_check, 2, window=60.0)
+        self.assertTrue(still_held)
+
+    def test_rate_limited_send_is_retried(self):
+        fake = self._FakeBot(rate_limited={1: 2})
+        delivered, sleep = self._run(lambda: bot._send_throttled(fake, self._messages(range(3))), 20)
+        self.assertEqual(delivered, {0, 1, 2})
+        self.assertEqual(sleep.await_count, 2)
+        sleep.assert_awaited_with(5)
+
+    def test_rate_limited_send_gives_up_after_retries(self):
+        fake = self._FakeBot(rate_limited={1: bot.TELEGRAM_SEND_RETRIES + 1})
+        delivered, _ = self._run(lambda: bot._send_throttled(fake, self._messages(range(2))), 20)
+        self.assertEqual(delivered, {0})
+
+    def test_failed_send_does_not_abort_others(self):
+        fake = self._FakeBot(fail_for={1})
+        delivered, _ = self._run(lambda: bot._send_throttled(fake, self._messages(range(3))), 20)
+        self.assertEqual(sorted(fake.sent), [0, 2])
+        self.assertEqual(delivered, {0, 2})
+
+
+class TestFetchPricesSingleflight(unittest.TestCase):
+    """Concurrent fetch_prices() calls for one (metal, city) share a scrape."""
+
+    def test_concurrent_calls_coalesce(self):
+        import threading
+        from unittest import mock
+        calls   = []
+        release = threading.Event()
+
+        def slow_prices(metal, city, force_refresh=False):
+            calls.append((metal, city))
+            release.wait(timeout=5)
+            return "prices"
+
+        async def scenario():
+            first  = bot.asyncio.ensure_future(bot.fetch_prices("gold", "delhi"))
+            second = bot.asyncio.ensure_future(bot.fetch_prices("Gold", "Delhi"))
+            other  = bot.asyncio.ensure_future(bot.fetch_prices("gold", "pune"))
+            await bot.asyncio.sleep(0.05)
+            release.set()
+            return await bot.asyncio.gather(first, second, other)
+
+        with mock.patch.object(bot, "get_metal_prices", side_effect=slow_prices):
+            results = bot.asyncio.run(scenario())
+
+        self.assertEqual(results, ["prices"] * 3)
+        self.assertEqual(sorted(calls), [("gold", "delhi"), ("gold", "pune")])
+        self.assertEqual(bot._inflight, {})
+
+    def test_errors_propagate_to_every_caller(self):
+        from unittest import mock
+
+        async def scenario():
+            return await bot.asyncio.gather(
+                bot.fetch_prices("gold", "delhi"),
+                bot.fetch_prices("gold", "delhi"),
+                return_exceptions=True,
+            )
+
+        with mock.patch.object(bot, "get_metal_prices", side_effect=ValueError("bad city")):
+            results = bot.asyncio.run(scenario())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+
+class TestFetchAndReply(unittest.TestCase):
+    """/gold and /silver replies: one message on a cache hit, edit on a miss."""
+
+    class _FakeMessage:
+        def __init__(self):
+            self.replies = []
+            self.edits   = []
+
+        async def reply_text(self, text, **kwargs):
+            self.replies.append(text)
+            return self
+
+        async def edit_text(self, text, **kwargs):
+            self.edits.append(text)
+
+    def setUp(self):
+        bot._price_cache.clear()
+        self.message = self._FakeMessage()
+        self.update  = _types.SimpleNamespace(message=self.message)
+
+    def test_cache_hit_sends_single_reply(self):
+        bot._set_cache("gold", "delhi", "cached table", 6000.0)
+        bot.asyncio.run(bot._fetch_and_reply(self.update, "gold", "delhi"))
+        self.assertEqual(self.message.replies, ["cached table"])
+        self.assertEqual(self.message.edits, [])
+
+    def test_force_refresh_bypasses_cache(self):
+        from unittest import mock
+        bot._set_cache("gold", "delhi", "cached table", 6000.0)
+        with mock.patch.object(bot, "get_metal_prices", return_value="fresh table"):
+            bot.asyncio.run(bot._fetch_and_reply(self.update, "gold", "delhi", force=True))
+        self.assertEqual(len(self.message.replies), 1)   # the loading placeholder
+        self.assertEqual(self.message.edits, ["fresh table"])
+
+    def test_invalid_city_reports_error(self):
+        bot.asyncio.run(bot._fetch_and_reply(self.update, "gold", "atlantis"))
+        self.assertTrue(self.message.edits[0].startswith("❌"))
+
+
+class TestDailyJob(unittest.TestCase):
+    """Verify job_daily_prices scrapes once per (metal, city), not per subscriber."""
+
+    def test_one_scrape_per_distinct_pair(self):
+        from unittest import mock
+        subs = [
+            {"chat_id": 1, "metal": "gold",   "city": "delhi"},
+            {"chat_id": 2, "metal": "gold",   "city": "delhi"},
+            {"chat_id": 3, "metal": "silver", "city": "pune"},
+        ]
+        scraped = []
+
+        def fake_prices(metal, city, force_refresh=False):
+            scraped.append((metal, city))
+            return f"{metal}/{city}"
+
+        fake_bot = TestSendThrottled._FakeBot()
+        context  = _types.SimpleNamespace(bot=fake_bot)
+        with mock.patch.object(bot, "get_all_subscriptions", return_value=subs), \
+             mock.patch.object(bot, "get_metal_prices", side_effect=fake_prices):
+            bot.asyncio.run(bot.job_daily_prices(context))
+
+        self.assertEqual(sorted(scraped), [("gold", "delhi"), ("silver", "pune")])
+        self.assertEqual(sorted(fake_bot.sent), [1, 2, 3])
+
+
+class TestLogListener(unittest.TestCase):
+    """Log records are handed to a queue and written by the listener thread."""
+
+    def test_records_reach_original_handlers(self):
+        import logging
+        root     = logging.getLogger()
+        original = root.handlers[:]
+        seen     = []
+
+        class _Collect(logging.Handler):
+            def emit(self, record):
+                seen.append(record.getMessage())
+
+        root.handlers = [_Collect()]
+        try:
+            listener = bot._start_log_listener()
+            self.assertIsInstance(root.handlers[0], bot.QueueHandler)
+            logging.getLogger("gold_bot.test").warning("queued %s", "record")
+            listener.stop()
+        finally:
+            root.handlers = original
+        self.assertIn("queued record", seen)
+
+
+class TestHealthServer(unittest.TestCase):
+    """The health endpoint answers any GET with the static JSON body."""
+
+    def test_get_returns_ok_json(self):
+        async def probe():
+            server = await bot.start_health_server(port=0)
+            port   = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await bot.asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                response = await reader.read()
+                writer.close()
+                return response
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        response = bot.asyncio.run(probe())
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(response.endswith(bot._HEALTH_BODY))
+        self.assertIn(b"Content-Length: %d\r\n" % len(bot._HEALTH_BODY), response)
+
+
+    def test_port_in_use_is_logged_not_raised(self):
+        loop = bot.asyncio.new_event_loop()
+        try:
+            first = loop.run_until_complete(bot.start_health_server(port=0))
+            port  = first.sockets[0].getsockname()[1]
+            with self.assertLogs(bot.logger, level="ERROR"):
+                self.assertIsNone(bot._open_health_port(loop, port))
+            first.close()
+            loop.run_until_complete(first.wait_closed())
+        finally:
+            loop.close()
+
+
 class TestJobQueueGuard(unittest.TestCase):
     """Verify main() handles a None job_queue without crashing."""
 
@@ -526,6 +1174,9 @@ class TestDatabaseSchema(unittest.TestCase):
     def test_alerts_table_exists(self):
         self.assertIn("alerts", self._tables())
 
+    def test_price_cache_table_exists(self):
+        self.assertIn("price_cache", self._tables())
+
     def test_subscriptions_columns(self):
         conn = sqlite3.connect(self._tmp.name)
         info = conn.execute("PRAGMA table_info(subscriptions)").fetchall()
@@ -542,6 +1193,26 @@ class TestDatabaseSchema(unittest.TestCase):
         for col in ("chat_id", "metal", "city", "threshold", "created_at"):
             self.assertIn(col, cols)
 
+    def test_alerts_table_migrated_with_notified_price(self):
+        conn = sqlite3.connect(self._tmp.name)
+        conn.executescript("""
+            DROP TABLE alerts;
+            CREATE TABLE alerts (chat_id INTEGER PRIMARY KEY, metal TEXT, city TEXT,
+                                 threshold REAL NOT NULL, created_at TEXT NOT NULL);
+        """)
+        conn.close()
+        bot.init_db()
+        conn = sqlite3.connect(self._tmp.name)
+        cols = {row[1] for row in conn.execute("PRAGMA table_info(alerts)")}
+        conn.close()
+        self.assertIn("notified_price", cols)
+
+    def test_alerts_metal_city_index_exists(self):
+        conn = sqlite3.connect(self._tmp.name)
+        rows = conn.execute("PRAGMA index_list(alerts)").fetchall()
+        conn.close()
+        self.assertIn("alerts_metal_city", {r[1] for r in rows})
+
     def test_init_db_is_idempotent(self):
         """Calling init_db twice should not raise or duplicate tables."""
         try: